@@ -1,57 +1,132 @@
+import io
+import os
+import tempfile
+
+import numpy as np
 import pandas as pd
+import pyarrow.feather as feather
 import streamlit as st
 
-# Load master sheet
-file_path = 'Top-Real-Estate-Markets-Raw-Data_GenAI.xlsx'
-df = pd.read_excel(file_path, sheet_name='Master Score Sheet')
 
-st.set_page_config(page_title="Golden Coast Capital Real Estate Market Scoring Tool", layout="wide")
-st.title("\U0001F3E1 Golden Coast Capital Real Estate Market Scoring Tool")
-st.subheader("\U0001F3AF Adjust Weights & Compare Markets")
+# Bump whenever the conversion in load_table changes so stale .arrow files are rebuilt
+arrow_format = 1
 
-# Sidebar adjustable financial inputs
-st.sidebar.header("\U0001F4B8 Financial Assumptions")
-interest_rate = st.sidebar.slider("Interest Rate (%)", 3.0, 10.0, 7.0) / 100
-loan_term_years = st.sidebar.slider("Loan Term (Years)", 15, 30, 30)
-down_payment_pct = st.sidebar.slider("Down Payment (%)", 0, 50, 20) / 100
-str_expense_ratio = st.sidebar.slider("STR Expenses (% of Revenue)", 10, 60, 30) / 100
-ltr_expense_ratio = st.sidebar.slider("LTR Expenses (% of Rent)", 10, 60, 40) / 100
 
-# Capital filter
-st.sidebar.header("\U0001F4B0 Capital Constraints")
-max_investment = st.sidebar.number_input("Max Capital Available ($)", value=100000, step=10000)
-include_renovation = st.sidebar.checkbox("Include $30K Renovation Buffer?", value=True)
-buffer = 30000 if include_renovation else 0
+# Load master sheet (converted once to Feather, memory-mapped & shared across sessions)
+@st.cache_resource
+def load_table(path):
+    arrow_path = f"{os.path.splitext(path)[0]}.v{arrow_format}.arrow"
+    if not os.path.exists(arrow_path) or os.path.getmtime(arrow_path) < os.path.getmtime(path):
+        df = pd.read_excel(path, sheet_name='Master Score Sheet')
+        # Market/State are only compared and listed, so store them as categorical codes
+        df = df.astype({'Market Name': 'category', 'State': 'category'})
+        # float32 is plenty for the sheet's prices, rates & scores and halves the bytes scanned
+        numeric_cols = df.select_dtypes('number').columns
+        df[numeric_cols] = df[numeric_cols].astype(np.float32)
+        # Write to a temp file and swap it in atomically so no worker maps a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(arrow_path) or '.', suffix='.arrow')
+        os.close(fd)
+        try:
+            feather.write_feather(df, tmp_path, compression='uncompressed')
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, arrow_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return feather.read_table(arrow_path, memory_map=True)
+
+
+def load_master(path):
+    return load_table(path).to_pandas()
+
 
-# Mortgage & Cash Flow Calculation
 price_col = 'Small Multi Median Sales Price 2025 YtD (2–4 Units)'
-price = df[price_col]
-loan_amount = price * (1 - down_payment_pct)
-monthly_interest = interest_rate / 12
-num_payments = loan_term_years * 12
-
-# Monthly mortgage formula
-monthly_mortgage = loan_amount * (
-    (monthly_interest * (1 + monthly_interest) ** num_payments) /
-    ((1 + monthly_interest) ** num_payments - 1)
-)
-df['Est_Mortgage'] = monthly_mortgage
-
-# Cash Flow calculations
-df['STR_Expenses'] = df['Annual Revenue'] * str_expense_ratio / 12
-df['STR_CashFlow'] = (df['Annual Revenue'] / 12) - df['Est_Mortgage'] - df['STR_Expenses']
-df['LTR_Expenses'] = df['2 Bed SFR Median Rent'] * ltr_expense_ratio
-df['LTR_CashFlow'] = df['2 Bed SFR Median Rent'] - df['Est_Mortgage'] - df['LTR_Expenses']
-
-df['STR_Positive_CF'] = (df['STR_CashFlow'] > 0).astype(int)
-df['LTR_Positive_CF'] = (df['LTR_CashFlow'] > 0).astype(int)
-
-# STR Yield
-df['STR_Yield'] = df['Annual Revenue'] / price
-
-# Capital requirement
-df['Total_Cash_Required'] = (down_payment_pct + 0.04) * df[price_col] + buffer
-df = df[df['Total_Cash_Required'] <= max_investment]
+
+
+# Mortgage, cash flow, yield & capital requirement depend only on the financial inputs,
+# so they are cached on those and reused while the weights change
+@st.cache_data(max_entries=32)
+def compute_financials(path, interest_rate, loan_term_years, down_payment_pct,
+                       str_expense_ratio, ltr_expense_ratio, buffer, max_investment):
+    df = load_master(path)
+    price = df[price_col].to_numpy()
+
+    # Capital requirement: filter first so the derived columns are only computed for markets in budget
+    cash_required = (down_payment_pct + 0.04) * price + buffer
+    mask = cash_required <= max_investment
+    df = df.iloc[mask]
+    price = price[mask]
+    revenue = df['Annual Revenue'].to_numpy()
+    rent = df['2 Bed SFR Median Rent'].to_numpy()
+
+    monthly_interest = interest_rate / 12
+    num_payments = loan_term_years * 12
+
+    # Monthly mortgage formula: the annuity factor is a scalar, so fold the loan-to-price
+    # ratio into it and scale the price column in a single pass
+    compound = (1 + monthly_interest) ** num_payments
+    payment_per_dollar = (1 - down_payment_pct) * monthly_interest * compound / (compound - 1)
+    mortgage = price * payment_per_dollar
+
+    # Cash Flow calculations
+    str_expenses = revenue * str_expense_ratio / 12
+    str_cash_flow = revenue / 12 - mortgage - str_expenses
+    ltr_expenses = rent * ltr_expense_ratio
+    ltr_cash_flow = rent - mortgage - ltr_expenses
+
+    # Derived columns are evaluated on the raw arrays and attached as one block;
+    # the binary flags reinterpret the boolean masks as int8 without another copy
+    derived = pd.DataFrame({
+        'Est_Mortgage': mortgage,
+        'STR_Expenses': str_expenses,
+        'STR_CashFlow': str_cash_flow,
+        'LTR_Expenses': ltr_expenses,
+        'LTR_CashFlow': ltr_cash_flow,
+        'STR_Positive_CF': (str_cash_flow > 0).view(np.int8),
+        'LTR_Positive_CF': (ltr_cash_flow > 0).view(np.int8),
+        'STR_Yield': revenue / price,
+        'Total_Cash_Required': cash_required[mask],
+    }, index=df.index)
+    return pd.concat([df, derived], axis=1)
+
+
+# Metric columns stacked into one min-max normalized float32 matrix, cached on the
+# filtered rows so a weight change only costs a single matrix-vector product
+@st.cache_data(max_entries=32)
+def score_matrix(df, cols):
+    # Min/max per metric in one agg pass (NaNs skipped)
+    stats = df[cols].agg(['min', 'max'])
+    col_min = stats.loc['min'].to_numpy(dtype=np.float32)
+    col_max = stats.loc['max'].to_numpy(dtype=np.float32)
+    constant = col_max == col_min
+    # Normalize in place on the one stacked copy instead of allocating per-step temporaries
+    norm = df[cols].to_numpy(dtype=np.float32, copy=True)
+    norm -= col_min
+    norm /= np.where(constant, 1, col_max - col_min)
+    norm[:, constant] = 0
+    invert_mask = np.array(["Price" in col or "Vacancy" in col for col in cols], dtype=bool)
+    return norm, invert_mask
+
+
+# Download payloads, cached on the scored table so reruns don't re-sort or re-serialize it;
+# kept small since every distinct weight combination produces a new table
+@st.cache_data(max_entries=4, ttl=3600)
+def to_csv_bytes(df):
+    return df.sort_values("Master Score", ascending=False).to_csv(index=False).encode()
+
+
+@st.cache_data(max_entries=4, ttl=3600)
+def to_parquet_bytes(df):
+    buf = io.BytesIO()
+    df.sort_values("Master Score", ascending=False).to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+file_path = 'Top-Real-Estate-Markets-Raw-Data_GenAI.xlsx'
+
+st.set_page_config(page_title="Golden Coast Capital Real Estate Market Scoring Tool", layout="wide")
+st.title("\U0001F3E1 Golden Coast Capital Real Estate Market Scoring Tool")
+st.subheader("\U0001F3AF Adjust Weights & Compare Markets")
 
 # Presets
 presets = {
@@ -75,8 +150,32 @@ presets = {
     }
 }
 
+# Weighting method & preset pick which sliders exist, so they apply immediately (outside the form)
 st.sidebar.header("⚖️ Weighting Method")
 weight_mode = st.sidebar.radio("Choose how you'd like to set weights:", ["High-Level Themes", "Detailed Metrics"])
+if weight_mode == "High-Level Themes":
+    preset_choice = st.sidebar.selectbox("Apply Preset Template", list(presets.keys()))
+    preset_weights = presets[preset_choice]
+
+# Sidebar controls live in one form so dragging several sliders costs a single rerun on "Apply"
+controls = st.sidebar.form("controls")
+
+# Sidebar adjustable financial inputs
+controls.header("\U0001F4B8 Financial Assumptions")
+interest_rate = controls.slider("Interest Rate (%)", 3.0, 10.0, 7.0) / 100
+loan_term_years = controls.slider("Loan Term (Years)", 15, 30, 30)
+down_payment_pct = controls.slider("Down Payment (%)", 0, 50, 20) / 100
+str_expense_ratio = controls.slider("STR Expenses (% of Revenue)", 10, 60, 30) / 100
+ltr_expense_ratio = controls.slider("LTR Expenses (% of Rent)", 10, 60, 40) / 100
+
+# Capital filter
+controls.header("\U0001F4B0 Capital Constraints")
+max_investment = controls.number_input("Max Capital Available ($)", value=100000, step=10000)
+include_renovation = controls.checkbox("Include $30K Renovation Buffer?", value=True)
+buffer = 30000 if include_renovation else 0
+
+df = compute_financials(file_path, interest_rate, loan_term_years, down_payment_pct,
+                        str_expense_ratio, ltr_expense_ratio, buffer, max_investment)
 
 # Group definitions
 groups = {
@@ -86,6 +185,14 @@ groups = {
     "Fundamentals": ["Population Growth (5 years)", "Rent Growth (YoY)", "Vacancy Rate"]
 }
 
+# Fixed metric order shared by the score matrix and the weight vector, plus the
+# (metrics x groups) matrix that spreads each group's weight evenly over its metrics
+metric_order = [metric for metric_list in groups.values() for metric in metric_list]
+group_expansion = np.array([
+    [1 / len(metric_list) if metric in metric_list else 0 for metric_list in groups.values()]
+    for metric in metric_order
+], dtype=np.float32)
+
 metric_descriptions = {
     "Market Score": "Overall STR market performance score from AirDNA.",
     "STR_Yield": "STR Annual Revenue divided by property price.",
@@ -104,73 +211,68 @@ metric_descriptions = {
 }
 
 # Weight setup
+controls.header("⚖️ Weights")
 if weight_mode == "High-Level Themes":
-    preset_choice = st.sidebar.selectbox("Apply Preset Template", list(presets.keys()))
-    preset_weights = presets[preset_choice]
-
     group_weights = {
-        group: st.sidebar.slider(group, 0.0, 1.0, preset_weights[group])
+        group: controls.slider(group, 0.0, 1.0, preset_weights[group])
         for group in groups
     }
-    metrics = {
-        metric: group_weights[group] / len(groups[group])
-        for group in groups for metric in groups[group]
-    }
+    weights = group_expansion @ np.fromiter(group_weights.values(), dtype=np.float32, count=len(groups))
 
     st.sidebar.markdown("### Group Weight Breakdown")
     st.sidebar.bar_chart(pd.DataFrame(group_weights.values(), index=group_weights.keys(), columns=["Weight"]))
 else:
-    metrics = {}
+    metric_weights = []
     for group, metric_list in groups.items():
-        st.sidebar.markdown(f"**{group}**")
+        controls.markdown(f"**{group}**")
         for metric in metric_list:
             help_text = metric_descriptions.get(metric, "")
-            metrics[metric] = st.sidebar.slider(metric, 0.0, 1.0, 0.05, help=help_text)
-
-# Normalize
-score = 0
-for col, weight in metrics.items():
-    if col in df.columns:
-        col_norm = (df[col] - df[col].min()) / (df[col].max() - df[col].min()) if df[col].max() != df[col].min() else 0
-        df[col + "_norm"] = col_norm
-        if "Price" in col or "Vacancy" in col:
-            score += weight * (1 - df[col + "_norm"])
-        else:
-            score += weight * df[col + "_norm"]
-
-df["Master Score"] = score
-sorted_df = df.sort_values("Master Score", ascending=False)
+            metric_weights.append(controls.slider(metric, 0.0, 1.0, 0.05, help=help_text))
+    weights = np.array(metric_weights, dtype=np.float32)
+
+controls.form_submit_button("Apply")
+
+if df.empty:
+    st.warning("No markets match your capital constraint")
+    st.stop()
+
+# Normalize & score: inverted (price/vacancy) columns score as 1 - norm, folded into the weights
+norm, invert_mask = score_matrix(df, metric_order)
+df = pd.concat([df, pd.DataFrame(norm, index=df.index, columns=[col + "_norm" for col in metric_order])], axis=1)
+df["Master Score"] = norm @ np.where(invert_mask, -weights, weights) + weights[invert_mask].sum()
 
 # Results Table
 top_n = st.selectbox("\U0001F539 Show Top N Markets", [5, 10, 15, 20], index=1)
-st.dataframe(sorted_df[["Market Name", "State", "Master Score"] + list(metrics.keys())].head(top_n), use_container_width=True)
+st.dataframe(df.nlargest(top_n, "Master Score")[["Market Name", "State", "Master Score"] + metric_order], use_container_width=True)
 
 # Compare Section
 st.markdown("---")
 st.subheader("\U0001F4CA Compare Two Markets Side-by-Side")
-market_list = sorted_df['Market Name'].unique().tolist()
+market_list = df.nlargest(200, "Master Score")['Market Name'].tolist()
 col1, col2 = st.columns(2)
 
 with col1:
     market_a = st.selectbox("Select Market A", market_list, index=0)
 with col2:
-    market_b = st.selectbox("Select Market B", market_list, index=1)
+    market_b = st.selectbox("Select Market B", market_list, index=1 if len(market_list) > 1 else 0)
 
 if market_a and market_b:
-    a_data = sorted_df[sorted_df['Market Name'] == market_a].iloc[0]
-    b_data = sorted_df[sorted_df['Market Name'] == market_b].iloc[0]
+    # Hash lookup by name; [0] keeps a single row even if a name repeats
+    names = pd.Index(df['Market Name'])
+    a_data = df.iloc[names.get_indexer_for([market_a])[0]]
+    b_data = df.iloc[names.get_indexer_for([market_b])[0]]
 
-    compare_metrics = ["Master Score"] + list(metrics.keys())
+    compare_metrics = ["Master Score"] + metric_order
     comp_table = pd.DataFrame({
-        'Metric': compare_metrics,
-        market_a: [a_data[m] for m in compare_metrics],
-        market_b: [b_data[m] for m in compare_metrics],
-    })
-    st.dataframe(comp_table.set_index('Metric'), use_container_width=True)
+        market_a: a_data.reindex(compare_metrics).to_numpy(),
+        market_b: b_data.reindex(compare_metrics).to_numpy(),
+    }, index=pd.Index(compare_metrics, name='Metric'))
+    st.dataframe(comp_table, use_container_width=True)
 
     if st.button("\U0001F4CB Generate Investor Analysis"):
         summary = f"""\n🧠 **Investor Insight Analysis**\n\nAs a seasoned investor with decades of success, here's my high-level comparison between **{market_a}** and **{market_b}**:\n\n▶️ **{market_a}**:\n- Master Score: {a_data['Master Score']:.2f}\n- STR Yield: {a_data.get('STR_Yield', 'N/A'):.2%} | LTR Gross Yield: {a_data.get('Gross Yield (SFR)', 'N/A'):.2%}\n- Occupancy Rate: {a_data.get('Occupancy', 'N/A'):.1f}%\n- Median Price (2–4 Units): ${a_data.get(price_col, 0):,.0f}\n- STR Cash Flow: ${a_data.get('STR_CashFlow', 0):,.0f} | LTR Cash Flow: ${a_data.get('LTR_CashFlow', 0):,.0f}\n\n▶️ **{market_b}**:\n- Master Score: {b_data['Master Score']:.2f}\n- STR Yield: {b_data.get('STR_Yield', 'N/A'):.2%} | LTR Gross Yield: {b_data.get('Gross Yield (SFR)', 'N/A'):.2%}\n- Occupancy Rate: {b_data.get('Occupancy', 'N/A'):.1f}%\n- Median Price (2–4 Units): ${b_data.get(price_col, 0):,.0f}\n- STR Cash Flow: ${b_data.get('STR_CashFlow', 0):,.0f} | LTR Cash Flow: ${b_data.get('LTR_CashFlow', 0):,.0f}\n\n✅ **Recommendation**:\nIf you're seeking higher STR upside, go with **{market_a if a_data['STR_Yield'] > b_data['STR_Yield'] else market_b}**.\nIf long-term resilience and safety are top priority, **{market_a if a_data['LTR_CashFlow'] > b_data['LTR_CashFlow'] else market_b}** may win.\n"""
         st.markdown(summary)
 
 # Download
-st.download_button("\U0001F4C2 Download Full Scored Table", sorted_df.to_csv(index=False), file_name="top_markets_scored.csv")
+st.download_button("\U0001F4C2 Download Full Scored Table", to_csv_bytes(df), file_name="top_markets_scored.csv")
+st.download_button("\U0001F4C2 Download Full Scored Table (Parquet)", to_parquet_bytes(df), file_name="top_markets_scored.parquet")